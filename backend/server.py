@@ -1,18 +1,21 @@
-from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, APIRouter, UploadFile, File, HTTPException, Body
+from fastapi.responses import StreamingResponse, ORJSONResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
 from typing import List, Optional, Dict, Any
+from functools import lru_cache
 import uuid
 from datetime import datetime, timezone, timedelta
 import calendar
 import io
 import csv
+from collections import ChainMap
 from openpyxl import Workbook
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from openpyxl.utils import get_column_letter
@@ -23,11 +26,12 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# tz_aware so created_at, stored as a native BSON date, reads back as UTC-aware
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
-# Create the main app
-app = FastAPI()
+# Create the main app; roster payloads are large, so serialize with orjson
+app = FastAPI(default_response_class=ORJSONResponse)
 api_router = APIRouter(prefix="/api")
 
 # Default color configuration matching the reference image
@@ -45,9 +49,21 @@ DEFAULT_SHIFT_COLORS = {
     "L": {"bg": "CC6600", "text": "FFFFFF"},      # Leave - Orange
 }
 
+# Shared Excel styles; openpyxl style objects are immutable, so one instance serves every export
+_THIN_SIDE = Side(style='thin')
+_THIN_BORDER = Border(left=_THIN_SIDE, right=_THIN_SIDE, top=_THIN_SIDE, bottom=_THIN_SIDE)
+_HEADER_FONT = Font(bold=True, size=10)
+_WEEKDAY_FONT = Font(bold=True, size=8)
+_GROUP_FONT = Font(bold=True, italic=True)
+_CENTER = Alignment(horizontal='center')
+_SHIFT_ALIGNMENT = Alignment(horizontal='center', vertical='center')
+
 # Position sort order
 POSITION_ORDER = {"AGSM": 0, "GSC": 1, "GSA": 2, "Welcome Agent": 3}
 
+# Positions that only ever work the 9am shift
+FIXED_9AM_POSITIONS = frozenset({"AGSM", "Welcome Agent"})
+
 # Models
 class Employee(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -92,31 +108,33 @@ class RosterResponse(BaseModel):
     view_type: str
     week_number: Optional[int] = None
 
+# Employees are stored with a numeric position_rank so MongoDB can return them
+# already in POSITION_ORDER (AGSM → GSC → GSA → Welcome Agent), then by last name
+EMPLOYEE_SORT = [("position_rank", 1), ("last_name", 1)]
+
+def employee_doc(emp: Employee) -> dict:
+    doc = emp.model_dump()
+    doc['position_rank'] = POSITION_ORDER.get(emp.position, 99)
+    return doc
+
 # Employee endpoints
 @api_router.post("/employees", response_model=Employee)
 async def create_employee(employee: EmployeeCreate):
     emp = Employee(**employee.model_dump())
-    doc = emp.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
-    await db.employees.insert_one(doc)
+    await db.employees.insert_one(employee_doc(emp))
     return emp
 
 @api_router.get("/employees", response_model=List[Employee])
 async def get_employees():
-    employees = await db.employees.find({}, {"_id": 0}).to_list(1000)
-    for emp in employees:
-        if isinstance(emp.get('created_at'), str):
-            emp['created_at'] = datetime.fromisoformat(emp['created_at'])
-    
-    # Sort by position order: AGSM → GSC → GSA → Welcome Agent
-    employees.sort(key=lambda x: (POSITION_ORDER.get(x['position'], 99), x['last_name']))
-    return employees
+    return await db.employees.find({}, {"_id": 0}).sort(EMPLOYEE_SORT).to_list(1000)
 
 @api_router.put("/employees/{employee_id}", response_model=Employee)
 async def update_employee(employee_id: str, update: EmployeeUpdate):
     update_data = {k: v for k, v in update.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
+    if 'position' in update_data:
+        update_data['position_rank'] = POSITION_ORDER.get(update_data['position'], 99)
     
     result = await db.employees.update_one(
         {"id": employee_id},
@@ -126,10 +144,14 @@ async def update_employee(employee_id: str, update: EmployeeUpdate):
         raise HTTPException(status_code=404, detail="Employee not found")
     
     employee = await db.employees.find_one({"id": employee_id}, {"_id": 0})
-    if isinstance(employee.get('created_at'), str):
-        employee['created_at'] = datetime.fromisoformat(employee['created_at'])
     return Employee(**employee)
 
+# Declared before /employees/{employee_id} so "bulk" isn't taken as an id
+@api_router.delete("/employees/bulk")
+async def bulk_delete_employees(employee_ids: List[str] = Body(...)):
+    result = await db.employees.delete_many({"id": {"$in": employee_ids}})
+    return {"deleted": result.deleted_count}
+
 @api_router.delete("/employees/{employee_id}")
 async def delete_employee(employee_id: str):
     result = await db.employees.delete_one({"id": employee_id})
@@ -139,13 +161,9 @@ async def delete_employee(employee_id: str):
 
 @api_router.post("/employees/bulk")
 async def bulk_create_employees(employees: List[EmployeeCreate]):
-    created = []
-    for emp_data in employees:
-        emp = Employee(**emp_data.model_dump())
-        doc = emp.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.employees.insert_one(doc)
-        created.append(emp)
+    created = [Employee(**emp_data.model_dump()) for emp_data in employees]
+    if created:
+        await db.employees.insert_many([employee_doc(emp) for emp in created])
     return created
 
 @api_router.post("/employees/import-csv")
@@ -162,12 +180,10 @@ async def import_csv(file: UploadFile = File(...)):
             position=row.get('position', row.get('POSITION', row.get('Position', 'GSC'))),
             group=row.get('group', row.get('GROUP', row.get('Group', None)))
         )
-        emp = Employee(**emp_data.model_dump())
-        doc = emp.model_dump()
-        doc['created_at'] = doc['created_at'].isoformat()
-        await db.employees.insert_one(doc)
-        created.append(emp)
+        created.append(Employee(**emp_data.model_dump()))
     
+    if created:
+        await db.employees.insert_many([employee_doc(emp) for emp in created])
     return {"imported": len(created), "employees": created}
 
 
@@ -182,244 +198,209 @@ def generate_roster(year: int, month: int, employees: List[dict],
     4. Max 5 night shifts per person per month
     5. Days off balanced across staff
     6. Days off always consecutive
+
+    Each employee gets a row of shifts indexed by day (0-based, None = unassigned);
+    rows are converted to date-keyed dicts only once at the end.
     """
     num_days = calendar.monthrange(year, month)[1]
+    date_strs = [f"{year}-{month:02d}-{d:02d}" for d in range(1, num_days + 1)]
+    day_index = {date_str: i for i, date_str in enumerate(date_strs)}
     
-    # Initialize empty roster
-    roster = {}
-    for emp in employees:
-        roster[emp['id']] = {}
-        for d in range(1, num_days + 1):
-            roster[emp['id']][f"{year}-{month:02d}-{d:02d}"] = None
+    # Weekday of every day in the month (0=Mon)
+    first_weekday = calendar.weekday(year, month, 1)
+    weekdays = [(first_weekday + i) % 7 for i in range(num_days)]
     
-    # Apply vacation and leave first
+    # Initialize empty roster and apply vacation and leave first
+    grid = {}
     for emp in employees:
         emp_id = emp['id']
-        if vacation_days.get(emp_id):
-            for date_str in vacation_days[emp_id]:
-                if date_str in roster[emp_id]:
-                    roster[emp_id][date_str] = 'V'
-        if leave_days.get(emp_id):
-            for date_str in leave_days[emp_id]:
-                if date_str in roster[emp_id]:
-                    roster[emp_id][date_str] = 'L'
-    
-    # Separate employees
-    fixed_9am = [e for e in employees if e['position'] in ['AGSM', 'Welcome Agent']]
-    flexible = [e for e in employees if e['position'] not in ['AGSM', 'Welcome Agent']]
+        row = [None] * num_days
+        for date_str in vacation_days.get(emp_id) or []:
+            if date_str in day_index:
+                row[day_index[date_str]] = 'V'
+        for date_str in leave_days.get(emp_id) or []:
+            if date_str in day_index:
+                row[day_index[date_str]] = 'L'
+        grid[emp_id] = row
+    
+    # Separate employees in one pass, keeping their order
+    fixed_9am, flexible = [], []
+    for emp in employees:
+        (fixed_9am if emp['position'] in FIXED_9AM_POSITIONS else flexible).append(emp)
     
     # STEP 1: Assign EXACTLY 2 consecutive off days per week for each employee
-    # Use actual calendar weeks (Mon-Sun)
-    first_day = datetime(year, month, 1)
-    first_weekday = first_day.weekday()  # 0=Mon
+    # Use actual calendar weeks (Mon-Sun); the first week starts on the 1st
+    week_starts = [0] + [i for i in range(1, num_days) if weekdays[i] == 0]
     
     for emp_idx, emp in enumerate(employees):
-        emp_id = emp['id']
+        row = grid[emp['id']]
         
         # Calculate base off day for this employee (staggered)
         base_off_day = emp_idx % 5  # 0-4 (Mon-Fri, leaving room for consecutive day)
         
-        # Find each Monday in the month to define weeks
-        d = 1
-        week_num = 0
-        while d <= num_days:
-            date_obj = datetime(year, month, d)
-            weekday = date_obj.weekday()
+        for week_num, week_start in enumerate(week_starts):
+            week_end = min(week_start + (6 - weekdays[week_start]), num_days - 1)  # Sunday or month end
             
-            # Find start of this calendar week
-            if weekday == 0 or d == 1:  # Monday or first day of month
-                # This starts a new week
-                week_start = d
-                week_end = min(d + (6 - weekday), num_days)  # End at Sunday or month end
-                
-                # Calculate off day for this employee this week
-                target_off_weekday = (base_off_day + week_num) % 5  # Rotate each week
-                
-                # Find the actual days
-                off_assigned = 0
-                for check_d in range(week_start, week_end + 1):
-                    check_date_obj = datetime(year, month, check_d)
-                    if check_date_obj.weekday() == target_off_weekday:
-                        # First off day
-                        date_str = f"{year}-{month:02d}-{check_d:02d}"
-                        if roster[emp_id].get(date_str) is None:
-                            roster[emp_id][date_str] = '0'
-                            off_assigned += 1
-                        
-                        # Second consecutive off day
-                        if check_d + 1 <= num_days:
-                            next_date_str = f"{year}-{month:02d}-{check_d+1:02d}"
-                            if roster[emp_id].get(next_date_str) is None:
-                                roster[emp_id][next_date_str] = '0'
-                                off_assigned += 1
-                        break
-                
-                # If we couldn't assign 2 off days, try alternative days
-                if off_assigned < 2:
-                    for check_d in range(week_start, week_end + 1):
-                        date_str = f"{year}-{month:02d}-{check_d:02d}"
-                        if roster[emp_id].get(date_str) is None:
-                            roster[emp_id][date_str] = '0'
+            # Calculate off day for this employee this week
+            target_off_weekday = (base_off_day + week_num) % 5  # Rotate each week
+            
+            # Find the actual days
+            off_assigned = 0
+            for i in range(week_start, week_end + 1):
+                if weekdays[i] == target_off_weekday:
+                    # First off day
+                    if row[i] is None:
+                        row[i] = '0'
+                        off_assigned += 1
+                    
+                    # Second consecutive off day
+                    if i + 1 < num_days and row[i + 1] is None:
+                        row[i + 1] = '0'
+                        off_assigned += 1
+                    break
+            
+            # If we couldn't assign 2 off days, try alternative days
+            if off_assigned < 2:
+                for i in range(week_start, week_end + 1):
+                    if row[i] is None:
+                        row[i] = '0'
+                        off_assigned += 1
+                        # Try to get consecutive
+                        if off_assigned < 2 and i + 1 < num_days and row[i + 1] is None:
+                            row[i + 1] = '0'
                             off_assigned += 1
-                            # Try to get consecutive
-                            if off_assigned < 2 and check_d + 1 <= num_days:
-                                next_date_str = f"{year}-{month:02d}-{check_d+1:02d}"
-                                if roster[emp_id].get(next_date_str) is None:
-                                    roster[emp_id][next_date_str] = '0'
-                                    off_assigned += 1
-                            if off_assigned >= 2:
-                                break
-                
-                week_num += 1
-                d = week_end + 1
-            else:
-                d += 1
-    
-    # STEP 2: Assign 9am shifts to AGSM and Welcome Agent
-    for emp in fixed_9am:
-        emp_id = emp['id']
-        for d in range(1, num_days + 1):
-            date_str = f"{year}-{month:02d}-{d:02d}"
-            if roster[emp_id][date_str] is None:
-                roster[emp_id][date_str] = '9'
+                        if off_assigned >= 2:
+                            break
     
-    # STEP 3: Assign night shifts (5 consecutive days, max 5 per person per month)
+    # STEP 2: Assign night shifts (5 consecutive days, max 5 per person per month)
+    # Nights have to rotate across staff day by day, so this is the only step
+    # that cannot run as a per-employee pass
     night_count = {e['id']: 0 for e in flexible}
     current_night_worker = None
     night_days_done = 0
     
-    for d in range(1, num_days + 1):
-        date_str = f"{year}-{month:02d}-{d:02d}"
-        date_obj = datetime(year, month, d)
-        weekday = date_obj.weekday()
-        
+    # Off days are fixed by now, so index each employee's next off day once:
+    # next_off[i] is the first off day at or after day i (num_days if none)
+    next_off = {}
+    for emp in flexible:
+        row = grid[emp['id']]
+        emp_next_off = [num_days] * (num_days + 1)
+        for i in range(num_days - 1, -1, -1):
+            emp_next_off[i] = i if row[i] == '0' else emp_next_off[i + 1]
+        next_off[emp['id']] = emp_next_off
+    
+    for i in range(num_days):
         # Start new night rotation
         if current_night_worker is None or night_days_done >= 5:
-            # Find next eligible employee
+            # Find next eligible employee with no off days in the next 5 days
+            block_end = min(i + 5, num_days)
             for emp in flexible:
                 emp_id = emp['id']
-                if night_count[emp_id] < 5:
-                    # Check if this employee has off days in next 5 days
-                    can_do = True
-                    for check_d in range(d, min(d + 5, num_days + 1)):
-                        check_date = f"{year}-{month:02d}-{check_d:02d}"
-                        if roster[emp_id].get(check_date) == '0':
-                            can_do = False
-                            break
-                    if can_do:
-                        current_night_worker = emp_id
-                        night_days_done = 0
-                        break
+                if night_count[emp_id] < 5 and next_off[emp_id][i] >= block_end:
+                    current_night_worker = emp_id
+                    night_days_done = 0
+                    break
         
         # Assign night shift
         if current_night_worker and night_days_done < 5:
-            if roster[current_night_worker].get(date_str) is None:
-                roster[current_night_worker][date_str] = '23'
+            row = grid[current_night_worker]
+            if row[i] is None:
+                row[i] = '23'
                 night_count[current_night_worker] += 1
-                night_days_done += 1
-            else:
-                # Can't assign night here, skip
-                night_days_done += 1
+            # Days that can't take a night shift still count towards the block
+            night_days_done += 1
     
-    # STEP 4: Assign morning/afternoon shifts with 11-hour rest rule
-    last_shift = {e['id']: None for e in flexible}
-    shift_type = {}
+    # STEP 3: Fill every remaining day in a single forward pass per employee.
+    # AGSM and Welcome Agent get 9am shifts; everyone else alternates between
+    # morning and afternoon weeks under the 11-hour rest rule.
+    for emp in fixed_9am:
+        row = grid[emp['id']]
+        for i in range(num_days):
+            if row[i] is None:
+                row[i] = '9'
     
     for emp_idx, emp in enumerate(flexible):
-        shift_type[emp['id']] = 'morning' if emp_idx % 2 == 0 else 'afternoon'
-    
-    for d in range(1, num_days + 1):
-        date_str = f"{year}-{month:02d}-{d:02d}"
-        date_obj = datetime(year, month, d)
-        weekday = date_obj.weekday()
+        row = grid[emp['id']]
+        target = 'morning' if emp_idx % 2 == 0 else 'afternoon'
+        prev = None
         
-        for emp in flexible:
-            emp_id = emp['id']
-            
-            # Skip if already assigned
-            if roster[emp_id].get(date_str) is not None:
-                last_shift[emp_id] = roster[emp_id][date_str]
-                continue
-            
-            target = shift_type[emp_id]
-            prev = last_shift[emp_id]
-            
-            # 11-hour rest rule
-            if prev == '7' and target == 'afternoon':
-                # Stay on morning
-                roster[emp_id][date_str] = '7'
-                last_shift[emp_id] = '7'
-            elif prev == '15' and target == 'morning':
-                # Stay on afternoon
-                roster[emp_id][date_str] = '15'
-                last_shift[emp_id] = '15'
-            elif prev == '23':
-                # After night, go to afternoon
-                roster[emp_id][date_str] = '15'
-                last_shift[emp_id] = '15'
-                shift_type[emp_id] = 'afternoon'
-            else:
-                if target == 'morning':
-                    roster[emp_id][date_str] = '7'
-                    last_shift[emp_id] = '7'
+        for i in range(num_days):
+            shift = row[i]
+            if shift is None:
+                # 11-hour rest rule
+                if prev == '7' and target == 'afternoon':
+                    # Stay on morning
+                    shift = '7'
+                elif prev == '15' and target == 'morning':
+                    # Stay on afternoon
+                    shift = '15'
+                elif prev == '23':
+                    # After night, go to afternoon
+                    shift = '15'
+                    target = 'afternoon'
                 else:
-                    roster[emp_id][date_str] = '15'
-                    last_shift[emp_id] = '15'
-        
-        # End of week - switch shift types
-        if weekday == 6:
-            for emp in flexible:
-                emp_id = emp['id']
-                shift_type[emp_id] = 'afternoon' if shift_type[emp_id] == 'morning' else 'morning'
+                    shift = '7' if target == 'morning' else '15'
+                row[i] = shift
+            prev = shift
+            
+            # End of week - switch shift types
+            if weekdays[i] == 6:
+                target = 'afternoon' if target == 'morning' else 'morning'
     
-    # STEP 5: Final validation - ensure no None values and validate consecutive offs
-    for emp in employees:
-        emp_id = emp['id']
-        
-        # Fill any remaining None values
-        for d in range(1, num_days + 1):
-            date_str = f"{year}-{month:02d}-{d:02d}"
-            if roster[emp_id].get(date_str) is None:
-                if emp['position'] in ['AGSM', 'Welcome Agent']:
-                    roster[emp_id][date_str] = '9'
-                else:
-                    roster[emp_id][date_str] = '15'
-        
-        # Ensure off days are consecutive
-        sorted_dates = sorted(roster[emp_id].keys())
+    # STEP 4: Ensure off days are consecutive
+    for row in grid.values():
         i = 0
-        while i < len(sorted_dates):
-            date_str = sorted_dates[i]
-            if roster[emp_id][date_str] == '0':
-                # Check if next day is also off
-                if i + 1 < len(sorted_dates):
-                    next_date = sorted_dates[i + 1]
-                    if roster[emp_id].get(next_date) != '0':
-                        # Make it consecutive
-                        if roster[emp_id].get(next_date) not in ['V', 'L']:
-                            roster[emp_id][next_date] = '0'
+        while i < num_days:
+            if row[i] == '0':
+                # Make it consecutive unless the next day is vacation/leave
+                if i + 1 < num_days and row[i + 1] not in ['0', 'V', 'L']:
+                    row[i + 1] = '0'
                 i += 2  # Skip the pair
             else:
                 i += 1
     
-    return roster
+    return {emp_id: dict(zip(date_strs, row)) for emp_id, row in grid.items()}
+
+
+@lru_cache(maxsize=64)
+def _generate_roster_cached(year: int, month: int,
+                            employees_key: tuple,
+                            vacation_key: tuple,
+                            leave_key: tuple) -> Dict[str, Dict[str, str]]:
+    employees = [{'id': emp_id, 'position': position} for emp_id, position in employees_key]
+    return generate_roster(year, month, employees, dict(vacation_key), dict(leave_key))
+
+
+def get_roster(year: int, month: int, employees: List[dict],
+               vacation_days: Dict[str, List[str]],
+               leave_days: Dict[str, List[str]]) -> Dict[str, Dict[str, str]]:
+    """
+    Memoized generate_roster. The roster only depends on the employees' ids,
+    positions and order plus vacation/leave, so previewing and then exporting
+    the same month computes it once. The result is shared between requests
+    and must not be mutated.
+    """
+    return _generate_roster_cached(
+        year,
+        month,
+        tuple((emp['id'], emp['position']) for emp in employees),
+        tuple(sorted((emp_id, tuple(days)) for emp_id, days in vacation_days.items())),
+        tuple(sorted((emp_id, tuple(days)) for emp_id, days in leave_days.items()))
+    )
 
 
-@api_router.post("/roster/generate", response_model=RosterResponse)
+@api_router.post("/roster/generate", response_model=RosterResponse, response_model_exclude_none=True)
 async def generate_roster_endpoint(request: RosterRequest):
     # Get employees from database
     employees = await db.employees.find(
         {"id": {"$in": request.employees}},
         {"_id": 0}
-    ).to_list(1000)
+    ).sort(EMPLOYEE_SORT).to_list(1000)
     
     if not employees:
         raise HTTPException(status_code=400, detail="No employees found")
     
-    # Sort employees by position order
-    employees.sort(key=lambda x: (POSITION_ORDER.get(x['position'], 99), x['last_name']))
-    
-    roster = generate_roster(
+    roster = get_roster(
         request.year, 
         request.month, 
         employees,
@@ -448,6 +429,15 @@ async def generate_roster_endpoint(request: RosterRequest):
             "date": f"{request.year}-{request.month:02d}-{day:02d}"
         })
     
+    # The roster is always generated for the whole month so the weekly rules
+    # hold, but a week view only needs to send the visible days
+    if request.view_type == "week" and request.week_number:
+        visible_dates = [info["date"] for info in days_info]
+        roster = {
+            emp_id: {date_str: days[date_str] for date_str in visible_dates if date_str in days}
+            for emp_id, days in roster.items()
+        }
+    
     return RosterResponse(
         year=request.year,
         month=request.month,
@@ -461,20 +451,20 @@ async def generate_roster_endpoint(request: RosterRequest):
 @api_router.post("/roster/export-excel")
 async def export_excel(request: RosterRequest):
     """Export roster as formatted Excel file"""
-    # Get employees
-    employees = await db.employees.find(
-        {"id": {"$in": request.employees}},
-        {"_id": 0}
-    ).to_list(1000)
+    # Get employees and the saved color configuration concurrently
+    employees, stored_colors = await asyncio.gather(
+        db.employees.find(
+            {"id": {"$in": request.employees}},
+            {"_id": 0}
+        ).sort(EMPLOYEE_SORT).to_list(1000),
+        db.color_config.find_one({"type": "shift_colors"}, {"_id": 0})
+    )
     
     if not employees:
         raise HTTPException(status_code=400, detail="No employees found")
     
-    # Sort employees by position order
-    employees.sort(key=lambda x: (POSITION_ORDER.get(x['position'], 99), x['last_name']))
-    
     # Generate roster
-    roster = generate_roster(
+    roster = get_roster(
         request.year,
         request.month,
         employees,
@@ -482,10 +472,16 @@ async def export_excel(request: RosterRequest):
         request.leave_days
     )
     
-    # Merge custom colors with defaults
-    shift_colors = DEFAULT_SHIFT_COLORS.copy()
-    for key, color in request.custom_colors.items():
-        shift_colors[key] = {"bg": color.bg.replace('#', ''), "text": color.text.replace('#', '')}
+    # Layer request colors over saved colors over the defaults without copying them
+    custom_colors = {
+        key: {"bg": color.bg.lstrip('#'), "text": color.text.lstrip('#')}
+        for key, color in request.custom_colors.items()
+    }
+    saved_colors = {
+        key: {"bg": color["bg"].lstrip('#'), "text": color["text"].lstrip('#')}
+        for key, color in (stored_colors or {}).get("colors", {}).items()
+    }
+    shift_colors = ChainMap(custom_colors, saved_colors, DEFAULT_SHIFT_COLORS)
     
     # Create Excel workbook
     wb = Workbook()
@@ -495,14 +491,10 @@ async def export_excel(request: RosterRequest):
     num_days = calendar.monthrange(request.year, request.month)[1]
     weekday_names = ['MON', 'TUE', 'WED', 'THU', 'FRI', 'SAT', 'SUN']
     
-    # Header styling
-    header_font = Font(bold=True, size=10)
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
+    # Column letters for every column, computed once
+    col_letters = [get_column_letter(col) for col in range(1, num_days + 4)]
+    date_strs = [f"{request.year}-{request.month:02d}-{day:02d}" for day in range(1, num_days + 1)]
+    first_weekday = calendar.weekday(request.year, request.month, 1)
     
     # Write header row 1 (day numbers)
     ws.cell(row=1, column=1, value="LAST NAME")
@@ -510,27 +502,27 @@ async def export_excel(request: RosterRequest):
     ws.cell(row=1, column=3, value="POSITION")
     
     for day in range(1, num_days + 1):
-        col = day + 3
-        ws.cell(row=1, column=col, value=day)
-        ws.cell(row=1, column=col).font = header_font
-        ws.cell(row=1, column=col).alignment = Alignment(horizontal='center')
-        ws.cell(row=1, column=col).border = thin_border
+        cell = ws.cell(row=1, column=day + 3, value=day)
+        cell.font = _HEADER_FONT
+        cell.alignment = _CENTER
+        cell.border = _THIN_BORDER
     
     # Write header row 2 (weekday names)
     for day in range(1, num_days + 1):
-        col = day + 3
-        date_obj = datetime(request.year, request.month, day)
-        ws.cell(row=2, column=col, value=weekday_names[date_obj.weekday()])
-        ws.cell(row=2, column=col).font = Font(bold=True, size=8)
-        ws.cell(row=2, column=col).alignment = Alignment(horizontal='center')
-        ws.cell(row=2, column=col).border = thin_border
+        cell = ws.cell(row=2, column=day + 3, value=weekday_names[(first_weekday + day - 1) % 7])
+        cell.font = _WEEKDAY_FONT
+        cell.alignment = _CENTER
+        cell.border = _THIN_BORDER
     
     # Set column widths - wider for names
     ws.column_dimensions['A'].width = 18
     ws.column_dimensions['B'].width = 18
     ws.column_dimensions['C'].width = 14
-    for day in range(1, num_days + 1):
-        ws.column_dimensions[get_column_letter(day + 3)].width = 5
+    for letter in col_letters[3:]:
+        ws.column_dimensions[letter].width = 5
+    
+    # Fill and font per shift code, created the first time the code is used
+    shift_styles = {}
     
     # Write employee rows
     row = 3
@@ -540,8 +532,7 @@ async def export_excel(request: RosterRequest):
         # Add group header if group changes
         if emp.get('group') and emp.get('group') != current_group:
             current_group = emp.get('group')
-            ws.cell(row=row, column=1, value=current_group)
-            ws.cell(row=row, column=1).font = Font(bold=True, italic=True)
+            ws.cell(row=row, column=1, value=current_group).font = _GROUP_FONT
             row += 1
         
         ws.cell(row=row, column=1, value=emp['last_name'])
@@ -549,24 +540,26 @@ async def export_excel(request: RosterRequest):
         ws.cell(row=row, column=3, value=emp['position'])
         
         for col in range(1, 4):
-            ws.cell(row=row, column=col).border = thin_border
+            ws.cell(row=row, column=col).border = _THIN_BORDER
         
         # Write shifts with colors
         emp_roster = roster.get(emp['id'], {})
-        for day in range(1, num_days + 1):
-            col = day + 3
-            date_str = f"{request.year}-{request.month:02d}-{day:02d}"
+        for day, date_str in enumerate(date_strs, start=1):
             shift = emp_roster.get(date_str, '')
             
-            cell = ws.cell(row=row, column=col, value=shift)
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = thin_border
+            cell = ws.cell(row=row, column=day + 3, value=shift)
+            cell.alignment = _SHIFT_ALIGNMENT
+            cell.border = _THIN_BORDER
             
             # Apply color based on shift
             if shift in shift_colors:
-                color = shift_colors[shift]
-                cell.fill = PatternFill(start_color=color["bg"], end_color=color["bg"], fill_type="solid")
-                cell.font = Font(color=color["text"], bold=True)
+                if shift not in shift_styles:
+                    color = shift_colors[shift]
+                    shift_styles[shift] = (
+                        PatternFill(start_color=color["bg"], end_color=color["bg"], fill_type="solid"),
+                        Font(color=color["text"], bold=True)
+                    )
+                cell.fill, cell.font = shift_styles[shift]
         
         row += 1
     
@@ -626,6 +619,20 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def init_employee_order():
+    await db.employees.create_index(EMPLOYEE_SORT)
+    # Backfill position_rank on employees stored before it existed
+    for position, rank in POSITION_ORDER.items():
+        await db.employees.update_many(
+            {"position": position, "position_rank": {"$exists": False}},
+            {"$set": {"position_rank": rank}}
+        )
+    await db.employees.update_many(
+        {"position_rank": {"$exists": False}},
+        {"$set": {"position_rank": 99}}
+    )
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
@@ -1,27 +1,199 @@
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util import Retry
 import sys
 import json
-from datetime import datetime, timedelta
+import threading
+import hashlib
+import os
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from datetime import datetime
 import calendar
-from collections import defaultdict, Counter
+from collections import deque, namedtuple
+import numpy as np
+
+from roster_rules_kernels import (
+    SHIFT_CODES, NO_SHIFT, UNKNOWN_SHIFT, AM_PM, PM_AM, check_all, check_invariants,
+)
+
+# orjson parses the large month-view roster several times faster than json
+try:
+    import orjson
+    loads = orjson.loads
+    dumps = orjson.dumps
+except ImportError:
+    loads = json.loads
+    dumps = lambda obj: json.dumps(obj).encode()
+
+# (connect, read) timeout for every API call, so a hung server can't stall the run
+DEFAULT_TIMEOUT = (3, 30)
+# Building the workbook takes longer than a JSON response
+EXPORT_TIMEOUT = (3, 60)
+
+# Every .xlsx is a zip archive, which starts with a local file header
+XLSX_MAGIC = b'PK\x03\x04'
+
+# Upper bound on API calls in flight at once against the test server
+MAX_CONCURRENT_CALLS = 8
+
+# Expected listing order of positions: AGSM → GSC → GSA → Welcome Agent
+POSITION_RANK = {p: i for i, p in enumerate(["AGSM", "GSC", "GSA", "Welcome Agent"])}
+
+# Employees created for a test run, one or more per position
+TEST_EMPLOYEES = [
+    {"last_name": "Smith", "first_name": "John", "position": "AGSM"},
+    {"last_name": "Johnson", "first_name": "Sarah", "position": "GSC"},
+    {"last_name": "Williams", "first_name": "Mike", "position": "GSA"},
+    {"last_name": "Brown", "first_name": "Lisa", "position": "Welcome Agent"},
+    {"last_name": "Davis", "first_name": "Tom", "position": "GSC"},
+    {"last_name": "Miller", "first_name": "Anna", "position": "GSA"},
+]
+
+# Month roster rule checks; each takes (roster_data, employees)
+ROSTER_RULES = (
+    "test_exactly_two_consecutive_off_days_per_week",
+    "test_balanced_off_days",
+    "test_agsm_welcome_agent_only_9am",
+    "test_night_shifts_five_day_blocks",
+    "test_no_am_pm_transition_without_off",
+)
+
+# Positions limited to the 9am shift
+FIXED_POSITIONS = ["AGSM", "Welcome Agent"]
+
+# Encoded month roster shared by the rule tests; see HotelRosterAPITester._roster_ctx
+RosterCtx = namedtuple('RosterCtx', [
+    'roster', 'employees', 'emp_ids', 'S', 'date_strs', 'num_days',
+    'pos_by_id', 'pos_array', 'rules',
+])
+
+def schedules_to_array(roster, dates=None):
+    """Encode a roster as (emp_ids, columns, int8 matrix of shape (employees, days))
+    
+    Columns follow `dates` when given (other days are ignored). Otherwise the
+    roster is taken to cover one month and column d is day d + 1, read from the
+    trailing DD of each date, so neighbouring columns are neighbouring days.
+    """
+    emp_ids = list(roster)
+    if dates is not None:
+        day_index = {date_str: d for d, date_str in enumerate(dates)}
+        columns = dates
+    else:
+        day_index = None
+        num_days = max((int(date_str[-2:]) for schedule in roster.values() for date_str in schedule), default=0)
+        columns = list(range(1, num_days + 1))
+    mat = np.full((len(emp_ids), len(columns)), NO_SHIFT, dtype=np.int8)
+    for e, emp_id in enumerate(emp_ids):
+        row = mat[e]
+        for date_str, shift in roster[emp_id].items():
+            d = int(date_str[-2:]) - 1 if day_index is None else day_index.get(date_str)
+            if d is not None:
+                row[d] = SHIFT_CODES.get(shift, UNKNOWN_SHIFT)
+    return emp_ids, columns, mat
+
+
+def check_all_rules(S, pos_array):
+    """Evaluate the month roster rules on a shift matrix in one pass
+    
+    S[emp, day] holds shift codes for consecutive calendar days starting on the
+    1st; pos_array holds each row's position ('' if unknown). Night-block and
+    AM/PM checks cover flexible staff only. Returns a dict of per-rule arrays:
+    week_off_counts / week_has_pair for full weeks, off_per_day, agsm_wa_bad,
+    night_blocks (rows, starts, lengths), am_pm and pm_am.
+    """
+    agsm_wa = np.isin(pos_array, FIXED_POSITIONS)
+    flexible = (pos_array != '') & ~agsm_wa
+    week_off_counts, week_has_pair, off_per_day, agsm_wa_bad, night_block_len, transitions = check_all(S, flexible, agsm_wa)
+    
+    rows, starts = np.nonzero(night_block_len)
+    return {
+        'week_off_counts': week_off_counts,
+        'week_has_pair': week_has_pair,
+        'off_per_day': off_per_day,
+        'agsm_wa_bad': agsm_wa_bad,
+        'night_blocks': (rows, starts, night_block_len[rows, starts]),
+        'am_pm': transitions == AM_PM,
+        'pm_am': transitions == PM_AM,
+    }
+
+# On-disk cache for idempotent GET responses, reused across quick re-runs
+CACHE_DIR = Path.home() / ".cache" / "roster_tests"
+CACHE_TTL = float(os.environ.get("ROSTER_TEST_CACHE_TTL", 60))
 
 class HotelRosterAPITester:
-    def __init__(self, base_url="https://rota-maker.preview.emergentagent.com"):
+    def __init__(self, base_url="https://rota-maker.preview.emergentagent.com", use_cache=True, verbose=False, quiet=False):
         self.base_url = base_url
+        # ROSTER_TEST_NO_CACHE=1 disables response caching like --no-cache
+        self.use_cache = use_cache and not os.environ.get('ROSTER_TEST_NO_CACHE')
         self.api_url = f"{base_url}/api"
-        self.tests_run = 0
-        self.tests_passed = 0
+        # Prefix for endpoint paths, so building a URL is one concatenation
+        self._u = self.api_url.rstrip('/') + '/'
+        # verbose adds request-level detail; quiet prints only the final summary,
+        # listing failures from test_results
+        self.verbose = verbose
+        self.quiet = quiet and not verbose
         self.created_employee_ids = []
-        self.test_results = []
+        # One record per test; deque appends are thread-safe, so concurrent tests
+        # need no lock and totals are derived once at the end
+        self.test_results = deque()
+        
+        # One keep-alive session for every call so the TLS handshake is paid once;
+        # transient gateway errors from the preview environment are retried with backoff
+        self.session = requests.Session()
+        retry = Retry(
+            total=3,
+            backoff_factor=0.2,
+            status_forcelist=(502, 503, 504),
+            allowed_methods=frozenset(['GET', 'POST', 'DELETE']),
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retry)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._json_headers = {'Content-Type': 'application/json'}
+        self.session.headers.update(self._json_headers)
+        
+        # Guards created ids and the roster cache when API calls run concurrently
+        self._lock = threading.Lock()
+        # Encoded rosters for the rule tests, keyed by id(roster_data)
+        self._ctx_cache = {}
+        # roster/generate responses for this run, keyed by a hash of the request body
+        self._gen_cache = {}
+        # Worker threads shared by every gather() for the whole run
+        self._executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS)
+
+    def close(self):
+        """Stop the worker threads and close the pooled HTTP connections"""
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+    def gather(self, *calls):
+        """Run independent API calls concurrently and return their results in order
+        
+        The calls share one executor, so they must not gather() themselves.
+        """
+        futures = [self._executor.submit(call) for call in calls]
+        return [future.result() for future in futures]
+
+    def _detail(self, message):
+        """Print request-level detail only with --verbose"""
+        if self.verbose:
+            print(message)
+
+    def _say(self, message):
+        """Print progress output unless --quiet"""
+        if not self.quiet:
+            print(message)
 
     def log_test(self, name, passed, details=""):
         """Log test result"""
-        self.tests_run += 1
         if passed:
-            self.tests_passed += 1
-            print(f"✅ {name}")
+            self._say(f"✅ {name}" + (f" - {details}" if details else ""))
         else:
-            print(f"❌ {name} - {details}")
+            self._say(f"❌ {name} - {details}")
         
         self.test_results.append({
             "name": name,
@@ -29,44 +201,72 @@ class HotelRosterAPITester:
             "details": details
         })
 
-    def run_test(self, name, method, endpoint, expected_status, data=None, headers=None):
-        """Run a single API test"""
-        url = f"{self.api_url}/{endpoint}"
-        if headers is None:
-            headers = {'Content-Type': 'application/json'}
+    def _cache_path(self, method, url, data):
+        key = hashlib.sha1(f"{method}{url}{json.dumps(data, sort_keys=True)}".encode()).hexdigest()
+        return CACHE_DIR / f"{key}.json"
+
+    def _read_cache(self, path):
+        """Return the cached response body, or None if missing or older than CACHE_TTL"""
+        try:
+            if time.time() - path.stat().st_mtime < CACHE_TTL:
+                return json.loads(path.read_text())
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def _write_cache(self, path, body):
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_text(json.dumps(body))
+        except OSError:
+            pass
+
+    def run_test(self, name, method, endpoint, expected_status, data=None, cacheable=False):
+        """Run a single API test
+        
+        cacheable=True lets a successful GET be answered from the on-disk cache on
+        re-runs; only use it for endpoints whose response doesn't depend on this run.
+        """
+        url = self._u + endpoint
 
-        self.tests_run += 1
-        print(f"\n🔍 Testing {name}...")
-        print(f"   URL: {url}")
+        self._detail(f"\n🔍 Testing {name}...")
+        self._detail(f"   URL: {url}")
+        
+        cache_path = None
+        if cacheable and self.use_cache and method == 'GET':
+            cache_path = self._cache_path(method, url, data)
+            cached = self._read_cache(cache_path)
+            if cached is not None:
+                self.log_test(name, True, "Cached response")
+                return True, cached
         
         try:
-            if method == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method == 'POST':
-                response = requests.post(url, json=data, headers=headers)
-            elif method == 'DELETE':
-                response = requests.delete(url, headers=headers)
+            # Pre-serialised body; Content-Type is already set on the session
+            body = dumps(data) if data is not None else None
+            response = self.session.request(method, url, data=body, timeout=DEFAULT_TIMEOUT)
 
             success = response.status_code == expected_status
             if success:
-                self.tests_passed += 1
-                print(f"✅ Passed - Status: {response.status_code}")
+                self.log_test(name, True, f"Status: {response.status_code}")
                 try:
-                    return success, response.json() if response.content else {}
+                    body = loads(response.content) if response.content else {}
                 except:
                     return success, {}
+                if cache_path is not None and response.status_code == 200:
+                    self._write_cache(cache_path, body)
+                return success, body
             else:
-                print(f"❌ Failed - Expected {expected_status}, got {response.status_code}")
-                print(f"   Response: {response.text[:200]}...")
+                self.log_test(name, False, f"Expected {expected_status}, got {response.status_code}")
+                self._detail(f"   Response: {response.content[:200].decode('utf-8', 'replace')}...")
                 return False, {}
 
         except Exception as e:
-            print(f"❌ Failed - Error: {str(e)}")
+            self.log_test(name, False, f"Error: {str(e)}")
             return False, {}
 
     def test_root_endpoint(self):
         """Test root API endpoint"""
-        return self.run_test("Root API", "GET", "", 200)
+        return self.run_test("Root API", "GET", "", 200, cacheable=True)
 
     def test_create_employee(self, last_name, first_name, position, group=None):
         """Test creating an employee"""
@@ -87,10 +287,43 @@ class HotelRosterAPITester:
         )
         
         if success and 'id' in response:
-            self.created_employee_ids.append(response['id'])
+            with self._lock:
+                self.created_employee_ids.append(response['id'])
             return response['id']
         return None
 
+    def test_bulk_create_employees(self, records):
+        """Test creating several employees in one request; returns their ids in order"""
+        url = self._u + "employees/bulk"
+        
+        name = f"Bulk Create Employees ({len(records)})"
+        
+        self._detail(f"\n🔍 Testing {name}...")
+        self._detail(f"   URL: {url}")
+        
+        try:
+            response = self.session.request('POST', url, data=dumps(records), timeout=DEFAULT_TIMEOUT)
+            
+            if response.status_code in (404, 405):
+                # Older backend without the bulk endpoint: create one by one
+                self._detail(f"   Bulk endpoint unavailable ({response.status_code}), creating individually")
+                return self.gather(*(partial(self.test_create_employee, **record) for record in records))
+            
+            if response.status_code == 200:
+                ids = [emp['id'] for emp in loads(response.content)]
+                with self._lock:
+                    self.created_employee_ids.extend(ids)
+                self.log_test(name, True, f"Status: {response.status_code}")
+                return ids
+            else:
+                self.log_test(name, False, f"Expected 200, got {response.status_code}")
+                self._detail(f"   Response: {response.content[:200].decode('utf-8', 'replace')}...")
+                return []
+                
+        except Exception as e:
+            self.log_test(name, False, f"Error: {str(e)}")
+            return []
+
     def test_get_employees(self):
         """Test getting all employees"""
         success, response = self.run_test(
@@ -109,10 +342,44 @@ class HotelRosterAPITester:
             f"employees/{employee_id}",
             200
         )
-        if success and employee_id in self.created_employee_ids:
-            self.created_employee_ids.remove(employee_id)
+        with self._lock:
+            if success and employee_id in self.created_employee_ids:
+                self.created_employee_ids.remove(employee_id)
         return success
 
+    def test_bulk_delete_employees(self, employee_ids):
+        """Test deleting several employees in one request"""
+        url = self._u + "employees/bulk"
+        
+        name = f"Bulk Delete Employees ({len(employee_ids)})"
+        
+        self._detail(f"\n🔍 Testing {name}...")
+        self._detail(f"   URL: {url}")
+        
+        try:
+            response = self.session.request('DELETE', url, data=dumps(employee_ids), timeout=DEFAULT_TIMEOUT)
+            
+            if response.status_code in (404, 405):
+                # Older backend without the bulk endpoint: delete one by one
+                self._detail(f"   Bulk endpoint unavailable ({response.status_code}), deleting individually")
+                return all(self.gather(*(partial(self.test_delete_employee, emp_id) for emp_id in employee_ids)))
+            
+            if response.status_code == 200:
+                with self._lock:
+                    deleted = set(employee_ids)
+                    self.created_employee_ids = [emp_id for emp_id in self.created_employee_ids if emp_id not in deleted]
+                self.log_test(name, True, f"Status: {response.status_code}")
+                self._detail(f"   Deleted: {loads(response.content).get('deleted')}")
+                return True
+            else:
+                self.log_test(name, False, f"Expected 200, got {response.status_code}")
+                self._detail(f"   Response: {response.content[:200].decode('utf-8', 'replace')}...")
+                return False
+                
+        except Exception as e:
+            self.log_test(name, False, f"Error: {str(e)}")
+            return False
+
     def test_generate_roster(self, year, month, employee_ids, view_type="month", week_number=None):
         """Test roster generation"""
         data = {
@@ -127,13 +394,27 @@ class HotelRosterAPITester:
         if view_type == "week" and week_number:
             data["week_number"] = week_number
         
+        name = f"Generate Roster ({month}/{year}) - {view_type.title()} View" + (f" Week {week_number}" if week_number else "")
+        
+        # Generation is deterministic, so an identical request within the run reuses the response
+        key = hashlib.blake2b(json.dumps(data, sort_keys=True).encode(), digest_size=16).digest()
+        if self.use_cache:
+            with self._lock:
+                cached = self._gen_cache.get(key)
+            if cached is not None:
+                self.log_test(name, True, "Cached response")
+                return cached
+        
         success, response = self.run_test(
-            f"Generate Roster ({month}/{year}) - {view_type.title()} View" + (f" Week {week_number}" if week_number else ""),
+            name,
             "POST",
             "roster/generate",
             200,
             data=data
         )
+        if success and self.use_cache:
+            with self._lock:
+                self._gen_cache[key] = response
         return response if success else {}
 
     def test_export_excel(self, year, month, employee_ids):
@@ -146,70 +427,65 @@ class HotelRosterAPITester:
             "leave_days": {}
         }
         
-        url = f"{self.api_url}/roster/export-excel"
-        headers = {'Content-Type': 'application/json'}
+        url = self._u + "roster/export-excel"
+        
+        name = f"Excel Export ({month}/{year})"
         
-        self.tests_run += 1
-        print(f"\n🔍 Testing Excel Export ({month}/{year})...")
-        print(f"   URL: {url}")
+        self._detail(f"\n🔍 Testing {name}...")
+        self._detail(f"   URL: {url}")
         
         try:
-            response = requests.post(url, json=data, headers=headers)
-            
-            success = response.status_code == 200
-            if success:
-                self.tests_passed += 1
-                print(f"✅ Passed - Status: {response.status_code}")
-                print(f"   Content-Type: {response.headers.get('content-type', 'N/A')}")
-                print(f"   Content-Length: {len(response.content)} bytes")
-                return True
-            else:
-                print(f"❌ Failed - Expected 200, got {response.status_code}")
-                print(f"   Response: {response.text[:200]}...")
-                return False
+            # Stream the workbook in chunks: keep only its zip signature and a byte
+            # count, so the body is never held whole and the drained connection
+            # goes back to the pool
+            with self.session.request('POST', url, data=dumps(data), stream=True, timeout=EXPORT_TIMEOUT) as response:
+                if response.status_code == 200:
+                    head = b''
+                    total = 0
+                    for chunk in response.iter_content(65536):
+                        if len(head) < len(XLSX_MAGIC):
+                            head += chunk[:len(XLSX_MAGIC) - len(head)]
+                        total += len(chunk)
+                    success = head == XLSX_MAGIC
+                    if success:
+                        self.log_test(name, True, f"Status: {response.status_code}")
+                    else:
+                        self.log_test(name, False, f"Body is not an XLSX file (starts with {head!r})")
+                    self._detail(f"   Content-Type: {response.headers.get('content-type', 'N/A')}")
+                    self._detail(f"   Size: {total} bytes")
+                    return success
+                else:
+                    head = response.raw.read(512, decode_content=True)
+                    self.log_test(name, False, f"Expected 200, got {response.status_code}")
+                    self._detail(f"   Response: {head.decode('utf-8', 'replace')[:200]}...")
+                    return False
                 
         except Exception as e:
-            print(f"❌ Failed - Error: {str(e)}")
+            self.log_test(name, False, f"Error: {str(e)}")
             return False
 
     def test_position_order(self, employees):
         """Test that employees are returned in correct position order: AGSM → GSC → GSA → Welcome Agent"""
-        print(f"\n🔍 Testing Position Order...")
-        
-        # Expected order
-        expected_order = ["AGSM", "GSC", "GSA", "Welcome Agent"]
-        
-        # Group employees by position
-        positions_found = []
-        for emp in employees:
-            if emp['position'] not in positions_found:
-                positions_found.append(emp['position'])
-        
-        # Check if positions appear in correct order
-        correct_order = True
-        last_position_index = -1
-        
-        for position in positions_found:
-            if position in expected_order:
-                current_index = expected_order.index(position)
-                if current_index < last_position_index:
-                    correct_order = False
-                    break
-                last_position_index = current_index
-        
-        self.tests_run += 1
+        self._detail(f"\n🔍 Testing Position Order...")
+        
+        # Distinct positions in first-seen order
+        positions_found = list(dict.fromkeys(emp['position'] for emp in employees))
+        
+        # Positions appear in correct order if their ranks never decrease
+        ranks = [POSITION_RANK[p] for p in positions_found if p in POSITION_RANK]
+        correct_order = ranks == sorted(ranks)
+        
         if correct_order:
-            self.tests_passed += 1
-            print(f"✅ Passed - Position order correct: {' → '.join(positions_found)}")
+            self.log_test("Position order", True, ' → '.join(positions_found))
         else:
-            print(f"❌ Failed - Position order incorrect: {' → '.join(positions_found)}")
-            print(f"   Expected order: {' → '.join(expected_order)}")
+            self.log_test("Position order", False,
+                          f"{' → '.join(positions_found)} (expected {' → '.join(POSITION_RANK)})")
         
         return correct_order
 
     def test_week_view_generation(self, year, month, employee_ids):
         """Test week view roster generation"""
-        print(f"\n🔍 Testing Week View Generation...")
+        self._detail(f"\n🔍 Testing Week View Generation...")
         
         # Test week 1
         week1_data = self.test_generate_roster(year, month, employee_ids, "week", 1)
@@ -220,436 +496,248 @@ class HotelRosterAPITester:
         days_count = len(week1_data.get('days_info', []))
         week_view_correct = days_count <= 7
         
-        self.tests_run += 1
         if week_view_correct:
-            self.tests_passed += 1
-            print(f"✅ Passed - Week view returns {days_count} days (≤7)")
+            self.log_test("Week view", True, f"returns {days_count} days (≤7)")
         else:
-            print(f"❌ Failed - Week view returns {days_count} days (should be ≤7)")
+            self.log_test("Week view", False, f"returns {days_count} days (should be ≤7)")
         
         return week_view_correct
 
-    def test_night_shift_constraints(self, roster_data):
-        """Test that night shifts (23) appear in consecutive blocks"""
-        print(f"\n🔍 Testing Night Shift Constraints...")
+    def test_roster_invariants(self, roster_data):
+        """Test that night shifts (23) appear in consecutive blocks and days off (0) in consecutive pairs
         
-        roster = roster_data.get('roster', {})
-        if not roster:
-            print("❌ No roster data to test")
-            return False
-        
-        night_shift_violations = 0
-        total_employees_checked = 0
-        
-        for emp_id, schedule in roster.items():
-            total_employees_checked += 1
-            dates = sorted(schedule.keys())
-            night_shifts = []
-            
-            # Find all night shift dates for this employee
-            for date in dates:
-                if schedule[date] == '23':
-                    night_shifts.append(date)
-            
-            if len(night_shifts) > 1:
-                # Check if night shifts are consecutive
-                for i in range(len(night_shifts) - 1):
-                    current_date = datetime.strptime(night_shifts[i], '%Y-%m-%d')
-                    next_date = datetime.strptime(night_shifts[i + 1], '%Y-%m-%d')
-                    
-                    # If there's a gap of more than 1 day, it's not consecutive
-                    if (next_date - current_date).days > 1:
-                        # Check if there are any non-night shifts in between
-                        gap_start = current_date
-                        gap_end = next_date
-                        has_non_night_in_gap = False
-                        
-                        current_check = gap_start
-                        while current_check < gap_end:
-                            current_check += timedelta(days=1)
-                            check_date_str = current_check.strftime('%Y-%m-%d')
-                            if check_date_str in schedule and schedule[check_date_str] not in ['23', '0']:
-                                has_non_night_in_gap = True
-                                break
-                        
-                        if has_non_night_in_gap:
-                            night_shift_violations += 1
-                            break
-        
-        self.tests_run += 1
-        if night_shift_violations == 0:
-            self.tests_passed += 1
-            print(f"✅ Passed - Night shifts appear in proper consecutive blocks")
-        else:
-            print(f"❌ Failed - {night_shift_violations} employees have non-consecutive night shifts")
-        
-        return night_shift_violations == 0
-
-    def test_days_off_consecutive(self, roster_data):
-        """Test that days off (0) appear in consecutive pairs"""
-        print(f"\n🔍 Testing Days Off Consecutive Constraint...")
+        The roster is encoded once as an int8 matrix and both invariants are checked
+        by one kernel sweep; reported as two results, returns (night_ok, off_ok).
+        """
+        self._detail(f"\n🔍 Testing Night Shift and Days Off Consecutive Constraints...")
         
         roster = roster_data.get('roster', {})
         if not roster:
-            print("❌ No roster data to test")
-            return False
+            self._say("❌ No roster data to test")
+            return False, False
         
-        violations = 0
-        total_employees_checked = 0
+        _, _, mat = schedules_to_array(roster)
+        night_shift_violations, off_day_violations = check_invariants(mat)
         
-        for emp_id, schedule in roster.items():
-            total_employees_checked += 1
-            dates = sorted(schedule.keys())
-            off_days = []
-            
-            # Find all off days for this employee
-            for date in dates:
-                if schedule[date] == '0':
-                    off_days.append(date)
-            
-            if len(off_days) > 0:
-                # Check if off days are in consecutive pairs
-                isolated_off_days = 0
-                
-                for i, off_date in enumerate(off_days):
-                    current_date = datetime.strptime(off_date, '%Y-%m-%d')
-                    
-                    # Check if this off day has an adjacent off day
-                    has_adjacent = False
-                    
-                    # Check previous day
-                    prev_date = (current_date - timedelta(days=1)).strftime('%Y-%m-%d')
-                    if prev_date in schedule and schedule[prev_date] == '0':
-                        has_adjacent = True
-                    
-                    # Check next day
-                    next_date = (current_date + timedelta(days=1)).strftime('%Y-%m-%d')
-                    if next_date in schedule and schedule[next_date] == '0':
-                        has_adjacent = True
-                    
-                    if not has_adjacent:
-                        isolated_off_days += 1
-                
-                if isolated_off_days > 0:
-                    violations += 1
-        
-        self.tests_run += 1
-        if violations == 0:
-            self.tests_passed += 1
-            print(f"✅ Passed - Days off appear in consecutive pairs")
-        else:
-            print(f"❌ Failed - {violations} employees have isolated off days")
+        night_ok = night_shift_violations == 0
+        off_ok = off_day_violations == 0
+        self.log_test("Night shifts appear in proper consecutive blocks", night_ok,
+                      "" if night_ok else f"{night_shift_violations} employees have non-consecutive night shifts")
+        self.log_test("Days off appear in consecutive pairs", off_ok,
+                      "" if off_ok else f"{off_day_violations} employees have isolated off days")
         
-        return violations == 0
+        return night_ok, off_ok
 
-    def test_exactly_two_consecutive_off_days_per_week(self, roster_data):
-        """Test Rule: Each employee has exactly 2 consecutive days off per week"""
-        print(f"\n🔍 Testing Exactly 2 Consecutive Off Days Per Week...")
+    def _roster_ctx(self, roster_data, employees):
+        """Return the encoded month roster shared by the rule tests
+        
+        S[emp, day] holds the shift code for each calendar day of the month with
+        rows in roster order; pos_array holds each row's position ('' if unknown)
+        and rules holds check_all_rules() for the roster. Built once per
+        roster_data (and rebuilt only if a different employee list is passed);
+        the context keeps roster_data alive so its id can't be reused while cached.
+        """
+        key = id(roster_data)
+        ctx = self._ctx_cache.get(key)
+        if ctx is not None and ctx.employees is employees:
+            return ctx
         
-        roster = roster_data.get('roster', {})
         year = roster_data.get('year')
         month = roster_data.get('month')
         num_days = calendar.monthrange(year, month)[1]
+        date_strs = [f"{year}-{month:02d}-{day:02d}" for day in range(1, num_days + 1)]
         
-        violations = []
+        emp_ids, _, S = schedules_to_array(roster_data.get('roster', {}), date_strs)
+        pos_by_id = {emp['id']: emp['position'] for emp in employees or ()}
+        pos_array = np.array([pos_by_id.get(emp_id, '') for emp_id in emp_ids], dtype=str)
         
-        for emp_id, schedule in roster.items():
-            # Group days by week
-            weeks = defaultdict(list)
-            for day in range(1, num_days + 1):
-                date_str = f"{year}-{month:02d}-{day:02d}"
-                date_obj = datetime(year, month, day)
-                week_num = (day - 1) // 7
-                shift = schedule.get(date_str, '')
-                weeks[week_num].append((day, shift))
-            
-            # Check each week
-            for week_num, week_days in weeks.items():
-                if len(week_days) < 7:  # Skip partial weeks
-                    continue
-                    
-                off_days = [day for day, shift in week_days if shift == '0']
-                
-                # Should have exactly 2 off days
-                if len(off_days) != 2:
-                    violations.append(f"Employee {emp_id} Week {week_num}: {len(off_days)} off days (expected 2)")
-                    continue
-                
-                # Check if off days are consecutive
-                if abs(off_days[1] - off_days[0]) != 1:
-                    violations.append(f"Employee {emp_id} Week {week_num}: Off days {off_days} not consecutive")
-        
-        self.tests_run += 1
-        if not violations:
-            self.tests_passed += 1
-            print(f"✅ Passed - All employees have exactly 2 consecutive off days per week")
-        else:
-            print(f"❌ Failed - {len(violations)} violations found:")
-            for violation in violations[:3]:  # Show first 3 violations
-                print(f"   • {violation}")
+        ctx = RosterCtx(roster_data, employees, emp_ids, S, date_strs, num_days,
+                        pos_by_id, pos_array, check_all_rules(S, pos_array))
+        self._ctx_cache[key] = ctx
+        return ctx
+
+    def _report_rule(self, violations, rule, failed_message):
+        """Log a rule check and print the first few violations"""
+        self.log_test(rule, not violations, f"{len(violations)} {failed_message}" if violations else "")
+        for violation in violations[:3]:  # Show first 3 violations
+            self._say(f"   • {violation}")
         
         return len(violations) == 0
 
-    def test_balanced_off_days(self, roster_data):
-        """Test Rule: Days off are balanced - not everyone off same day"""
-        print(f"\n🔍 Testing Balanced Off Days...")
-        
-        roster = roster_data.get('roster', {})
-        year = roster_data.get('year')
-        month = roster_data.get('month')
-        num_days = calendar.monthrange(year, month)[1]
-        
-        # Count off days per date
-        off_count_per_day = defaultdict(int)
-        total_employees = len(roster)
+    def test_exactly_two_consecutive_off_days_per_week(self, roster_data, employees):
+        """Test Rule: Each employee has exactly 2 consecutive days off per week"""
+        self._detail(f"\n🔍 Testing Exactly 2 Consecutive Off Days Per Week...")
         
-        for day in range(1, num_days + 1):
-            date_str = f"{year}-{month:02d}-{day:02d}"
-            for emp_id, schedule in roster.items():
-                if schedule.get(date_str) == '0':
-                    off_count_per_day[date_str] += 1
+        ctx = self._roster_ctx(roster_data, employees)
+        emp_ids = ctx.emp_ids
+        off_counts, has_pair = ctx.rules['week_off_counts'], ctx.rules['week_has_pair']
         
-        # Check if any day has too many people off (more than 50% of staff)
-        max_allowed_off = max(1, total_employees // 2)
         violations = []
+        for e, week_num in np.argwhere((off_counts != 2) | ~has_pair):
+            if off_counts[e, week_num] != 2:
+                violations.append(f"Employee {emp_ids[e]} Week {week_num}: {off_counts[e, week_num]} off days (expected 2)")
+            else:
+                week_start = week_num * 7
+                off_days = (np.flatnonzero(ctx.S[e, week_start:week_start + 7] == 0) + week_start + 1).tolist()
+                violations.append(f"Employee {emp_ids[e]} Week {week_num}: Off days {off_days} not consecutive")
         
-        for date_str, count in off_count_per_day.items():
-            if count > max_allowed_off:
-                violations.append(f"Date {date_str}: {count} employees off (max allowed: {max_allowed_off})")
+        return self._report_rule(violations,
+                                 "All employees have exactly 2 consecutive off days per week",
+                                 "weekly off-day violations found")
+
+    def test_balanced_off_days(self, roster_data, employees):
+        """Test Rule: Days off are balanced - not everyone off same day"""
+        self._detail(f"\n🔍 Testing Balanced Off Days...")
         
-        self.tests_run += 1
-        if not violations:
-            self.tests_passed += 1
-            print(f"✅ Passed - Off days are balanced across staff")
-        else:
-            print(f"❌ Failed - {len(violations)} days with too many staff off:")
-            for violation in violations[:3]:
-                print(f"   • {violation}")
+        ctx = self._roster_ctx(roster_data, employees)
         
-        return len(violations) == 0
+        # Check if any day has too many people off (more than 50% of staff)
+        off_count_per_day = ctx.rules['off_per_day']
+        max_allowed_off = max(1, len(ctx.emp_ids) // 2)
+        violations = [f"Date {ctx.date_strs[d]}: {off_count_per_day[d]} employees off (max allowed: {max_allowed_off})"
+                      for d in np.flatnonzero(off_count_per_day > max_allowed_off)]
+        
+        return self._report_rule(violations,
+                                 "Off days are balanced across staff",
+                                 "days with too many staff off")
 
     def test_agsm_welcome_agent_only_9am(self, roster_data, employees):
         """Test Rule: AGSM and Welcome Agent only have 9am shifts"""
-        print(f"\n🔍 Testing AGSM/Welcome Agent Only 9am Shifts...")
+        self._detail(f"\n🔍 Testing AGSM/Welcome Agent Only 9am Shifts...")
         
+        ctx = self._roster_ctx(roster_data, employees)
+        emp_ids, dates = ctx.emp_ids, ctx.date_strs
         roster = roster_data.get('roster', {})
-        year = roster_data.get('year')
-        month = roster_data.get('month')
-        num_days = calendar.monthrange(year, month)[1]
-        
-        # Create position map
-        position_map = {emp['id']: emp['position'] for emp in employees}
         
-        violations = []
+        # Should only have '9' (9am) or '0' (off) shifts, or vacation/leave
+        violations = [f"{ctx.pos_array[e]} employee {emp_ids[e]}: shift '{roster[emp_ids[e]].get(dates[d], '')}' on {dates[d]}"
+                      for e, d in np.argwhere(ctx.rules['agsm_wa_bad'])]
         
-        for emp_id, schedule in roster.items():
-            if emp_id not in position_map:
-                continue
-                
-            position = position_map[emp_id]
-            
-            if position in ['AGSM', 'Welcome Agent']:
-                for day in range(1, num_days + 1):
-                    date_str = f"{year}-{month:02d}-{day:02d}"
-                    shift = schedule.get(date_str, '')
-                    
-                    # Should only have '9' (9am) or '0' (off) shifts
-                    if shift not in ['9', '0', 'V', 'L']:
-                        violations.append(f"{position} employee {emp_id}: shift '{shift}' on {date_str}")
-        
-        self.tests_run += 1
-        if not violations:
-            self.tests_passed += 1
-            print(f"✅ Passed - AGSM/Welcome Agent employees only have 9am shifts")
-        else:
-            print(f"❌ Failed - {len(violations)} violations found:")
-            for violation in violations[:3]:
-                print(f"   • {violation}")
-        
-        return len(violations) == 0
+        return self._report_rule(violations,
+                                 "AGSM/Welcome Agent employees only have 9am shifts",
+                                 "AGSM/Welcome Agent shift violations found")
 
     def test_night_shifts_five_day_blocks(self, roster_data, employees):
         """Test Rule: Night shifts (23) appear in 5-day consecutive blocks"""
-        print(f"\n🔍 Testing Night Shifts in 5-Day Consecutive Blocks...")
-        
-        roster = roster_data.get('roster', {})
-        year = roster_data.get('year')
-        month = roster_data.get('month')
-        num_days = calendar.monthrange(year, month)[1]
-        
-        # Get flexible employees (not AGSM/Welcome Agent)
-        position_map = {emp['id']: emp['position'] for emp in employees}
-        flexible_employees = [emp_id for emp_id, pos in position_map.items() 
-                            if pos not in ['AGSM', 'Welcome Agent']]
+        self._detail(f"\n🔍 Testing Night Shifts in 5-Day Consecutive Blocks...")
         
-        violations = []
+        ctx = self._roster_ctx(roster_data, employees)
+        emp_ids = ctx.emp_ids
         
-        for emp_id in flexible_employees:
-            if emp_id not in roster:
-                continue
-                
-            schedule = roster[emp_id]
-            night_shifts = []
-            
-            # Find all night shifts for this employee
-            for day in range(1, num_days + 1):
-                date_str = f"{year}-{month:02d}-{day:02d}"
-                if schedule.get(date_str) == '23':
-                    night_shifts.append(day)
-            
-            if not night_shifts:
-                continue  # No night shifts for this employee
-            
-            # Check if night shifts are in consecutive blocks of 5
-            current_block = [night_shifts[0]]
-            blocks = []
-            
-            for i in range(1, len(night_shifts)):
-                if night_shifts[i] == night_shifts[i-1] + 1:
-                    current_block.append(night_shifts[i])
-                else:
-                    blocks.append(current_block)
-                    current_block = [night_shifts[i]]
-            blocks.append(current_block)
-            
-            # Each block should be exactly 5 days
-            for block in blocks:
-                if len(block) != 5:
-                    violations.append(f"Employee {emp_id}: night shift block of {len(block)} days (expected 5): {block}")
-        
-        self.tests_run += 1
-        if not violations:
-            self.tests_passed += 1
-            print(f"✅ Passed - Night shifts appear in 5-day consecutive blocks")
-        else:
-            print(f"❌ Failed - {len(violations)} violations found:")
-            for violation in violations[:3]:
-                print(f"   • {violation}")
+        # Each block should be exactly 5 days
+        violations = [f"Employee {emp_ids[e]}: night shift block of {length} days (expected 5): {list(range(start + 1, start + length + 1))}"
+                      for e, start, length in zip(*ctx.rules['night_blocks']) if length != 5]
         
-        return len(violations) == 0
+        return self._report_rule(violations,
+                                 "Night shifts appear in 5-day consecutive blocks",
+                                 "night-block violations found")
 
     def test_no_am_pm_transition_without_off(self, roster_data, employees):
         """Test Rule: No AM→PM transition without off day between"""
-        print(f"\n🔍 Testing No AM→PM Transition Without Off Day...")
+        self._detail(f"\n🔍 Testing No AM→PM Transition Without Off Day...")
         
-        roster = roster_data.get('roster', {})
-        year = roster_data.get('year')
-        month = roster_data.get('month')
-        num_days = calendar.monthrange(year, month)[1]
+        ctx = self._roster_ctx(roster_data, employees)
+        emp_ids, dates = ctx.emp_ids, ctx.date_strs
         
-        # Get flexible employees (not AGSM/Welcome Agent)
-        position_map = {emp['id']: emp['position'] for emp in employees}
-        flexible_employees = [emp_id for emp_id, pos in position_map.items() 
-                            if pos not in ['AGSM', 'Welcome Agent']]
+        am_pm, pm_am = ctx.rules['am_pm'], ctx.rules['pm_am']
+        violations = [f"Employee {emp_ids[e]}: {'AM→PM' if am_pm[e, d] else 'PM→AM'} transition {dates[d]}→{dates[d + 1]}"
+                      for e, d in np.argwhere(am_pm | pm_am)]
         
-        violations = []
-        
-        for emp_id in flexible_employees:
-            if emp_id not in roster:
-                continue
-                
-            schedule = roster[emp_id]
-            
-            for day in range(1, num_days):
-                today_date = f"{year}-{month:02d}-{day:02d}"
-                tomorrow_date = f"{year}-{month:02d}-{day+1:02d}"
-                
-                today_shift = schedule.get(today_date, '')
-                tomorrow_shift = schedule.get(tomorrow_date, '')
-                
-                # Check AM→PM transition (7→15)
-                if today_shift == '7' and tomorrow_shift == '15':
-                    violations.append(f"Employee {emp_id}: AM→PM transition {today_date}→{tomorrow_date}")
-                
-                # Check PM→AM transition (15→7)
-                if today_shift == '15' and tomorrow_shift == '7':
-                    violations.append(f"Employee {emp_id}: PM→AM transition {today_date}→{tomorrow_date}")
-        
-        self.tests_run += 1
-        if not violations:
-            self.tests_passed += 1
-            print(f"✅ Passed - No AM↔PM transitions without off day")
-        else:
-            print(f"❌ Failed - {len(violations)} violations found:")
-            for violation in violations[:3]:
-                print(f"   • {violation}")
-        
-        return len(violations) == 0
+        return self._report_rule(violations,
+                                 "No AM↔PM transitions without off day",
+                                 "AM↔PM transition violations found")
 
     def cleanup(self):
         """Clean up created employees"""
-        print(f"\n🧹 Cleaning up {len(self.created_employee_ids)} created employees...")
-        for emp_id in self.created_employee_ids.copy():
-            self.test_delete_employee(emp_id)
+        with self._lock:
+            employee_ids = self.created_employee_ids.copy()
+        self._say(f"\n🧹 Cleaning up {len(employee_ids)} created employees...")
+        if employee_ids:
+            self.test_bulk_delete_employees(employee_ids)
+        self.close()
+
+# pytest entry points (pytest --api-url <backend>); the session fixtures they
+# use live in conftest.py
+
+def test_root_api(tester):
+    success, _ = tester.test_root_endpoint()
+    assert success
+
+def test_position_order(tester, employees):
+    assert tester.test_position_order(employees)
+
+def test_week_view(tester, employee_ids, roster_month):
+    assert tester.test_week_view_generation(*roster_month, employee_ids)
+
+def test_excel_export(tester, employee_ids, roster_month):
+    assert tester.test_export_excel(*roster_month, employee_ids)
+
+def test_roster_rule(tester, roster_data, employees, rule):
+    check = getattr(tester, rule)
+    assert check(roster_data, employees)
+
+def test_roster_invariants(tester, roster_data):
+    night_ok, off_ok = tester.test_roster_invariants(roster_data)
+    assert night_ok and off_ok
 
 def main():
     print("🏨 Hotel Staff Roster Generator - Backend API Testing")
     print("=" * 60)
     
-    tester = HotelRosterAPITester()
+    args = sys.argv[1:]
+    tester = HotelRosterAPITester(
+        use_cache='--no-cache' not in args,
+        verbose='--verbose' in args,
+        quiet='--quiet' in args,
+    )
     
     # Test 1: Root endpoint
     tester.test_root_endpoint()
     
-    # Test 2: Create test employees with all required positions
-    print("\n📝 Creating test employees...")
-    emp1_id = tester.test_create_employee("Smith", "John", "AGSM")
-    emp2_id = tester.test_create_employee("Johnson", "Sarah", "GSC")
-    emp3_id = tester.test_create_employee("Williams", "Mike", "GSA")
-    emp4_id = tester.test_create_employee("Brown", "Lisa", "Welcome Agent")
-    emp5_id = tester.test_create_employee("Davis", "Tom", "GSC")
-    emp6_id = tester.test_create_employee("Miller", "Anna", "GSA")
+    # Test 2: Create test employees with all required positions in one request
+    tester._say("\n📝 Creating test employees...")
+    created_ids = tester.test_bulk_create_employees(TEST_EMPLOYEES)
     
     # Test 3: Get employees and check position order
     employees = tester.test_get_employees()
-    print(f"   Found {len(employees)} employees in database")
+    tester._say(f"   Found {len(employees)} employees in database")
     
     # Test position order
     if employees:
         tester.test_position_order(employees)
     
     # Test 4: Generate roster and test all rules (if we have employees)
-    employee_ids = [emp_id for emp_id in [emp1_id, emp2_id, emp3_id, emp4_id, emp5_id, emp6_id] if emp_id]
+    employee_ids = [emp_id for emp_id in created_ids if emp_id]
     
     if len(employee_ids) >= 4:  # Need at least 4 employees for meaningful testing
-        current_year = datetime.now().year
-        current_month = datetime.now().month
+        # Read the clock once so year and month can't straddle a month boundary
+        now = datetime.now()
+        current_year, current_month = now.year, now.month
         
-        print(f"\n📅 Testing roster generation for {current_month}/{current_year}...")
+        tester._say(f"\n📅 Testing roster generation for {current_month}/{current_year}...")
         
-        # Test month view
-        roster_data = tester.test_generate_roster(
-            current_year, 
-            current_month, 
-            employee_ids,
-            "month"
+        # Month view, week view (Test 5) and Excel export (Test 6) are independent
+        roster_data, _, _ = tester.gather(
+            partial(tester.test_generate_roster, current_year, current_month, employee_ids, "month"),
+            partial(tester.test_week_view_generation, current_year, current_month, employee_ids),
+            partial(tester.test_export_excel, current_year, current_month, employee_ids),
         )
         
         if roster_data:
-            print(f"   Generated roster with {len(roster_data.get('roster', {}))} employee schedules")
-            print(f"   Days info: {len(roster_data.get('days_info', []))} days")
+            tester._say(f"   Generated roster with {len(roster_data.get('roster', {}))} employee schedules")
+            tester._say(f"   Days info: {len(roster_data.get('days_info', []))} days")
             
-            print("\n🔍 Testing Hotel Roster Rules...")
-            print("-" * 40)
+            tester._say("\n🔍 Testing Hotel Roster Rules...")
+            tester._say("-" * 40)
             
             # Test all specific roster rules
-            tester.test_exactly_two_consecutive_off_days_per_week(roster_data)
-            tester.test_balanced_off_days(roster_data)
-            tester.test_agsm_welcome_agent_only_9am(roster_data, employees)
-            tester.test_night_shifts_five_day_blocks(roster_data, employees)
-            tester.test_no_am_pm_transition_without_off(roster_data, employees)
+            for rule in ROSTER_RULES:
+                getattr(tester, rule)(roster_data, employees)
             
             # Test existing business logic constraints
-            tester.test_night_shift_constraints(roster_data)
-            tester.test_days_off_consecutive(roster_data)
-            
-            # Test week view
-            tester.test_week_view_generation(current_year, current_month, employee_ids)
-            
-            # Test 5: Excel export
-            tester.test_export_excel(current_year, current_month, employee_ids)
+            tester.test_roster_invariants(roster_data)
     else:
-        print("❌ Not enough employees created for roster testing")
+        tester._say("❌ Not enough employees created for roster testing")
     
     # Cleanup
     tester.cleanup()
@@ -657,11 +745,18 @@ def main():
     # Print results
     print(f"\n📊 Backend API Test Results")
     print("=" * 40)
-    print(f"Tests passed: {tester.tests_passed}/{tester.tests_run}")
+    tests_run = len(tester.test_results)
+    tests_passed = sum(result['passed'] for result in tester.test_results)
+    print(f"Tests passed: {tests_passed}/{tests_run}")
     
-    success_rate = (tester.tests_passed / tester.tests_run * 100) if tester.tests_run > 0 else 0
+    success_rate = (tests_passed / tests_run * 100) if tests_run > 0 else 0
     print(f"Success rate: {success_rate:.1f}%")
     
+    if tester.quiet:
+        for result in tester.test_results:
+            if not result["passed"]:
+                print(f"❌ {result['name']} - {result['details']}")
+    
     if success_rate >= 80:
         print("✅ Backend APIs are working well!")
         return 0
@@ -0,0 +1,75 @@
+"""Session fixtures for running the checks in backend_test.py under pytest
+
+    pytest --api-url http://localhost:8001
+
+The tests create and delete employees, so they only run against a backend
+named with --api-url or ROSTER_TEST_BASE_URL and are skipped otherwise. The
+employees are created once per session and cleaned up when it ends.
+"""
+import os
+from datetime import datetime
+from functools import partial
+
+import pytest
+
+from backend_test import HotelRosterAPITester, TEST_EMPLOYEES, ROSTER_RULES
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        "--api-url",
+        default=os.environ.get("ROSTER_TEST_BASE_URL"),
+        help="Base URL of the backend under test; the API tests are skipped without it",
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if "rule" in metafunc.fixturenames:
+        metafunc.parametrize("rule", list(ROSTER_RULES))
+
+
+@pytest.fixture(scope="session")
+def tester(request):
+    api_url = request.config.getoption("--api-url")
+    if not api_url:
+        pytest.skip("set --api-url or ROSTER_TEST_BASE_URL to run the API tests")
+    # No response cache: every check must reach the backend under test
+    tester = HotelRosterAPITester(api_url, use_cache=False, verbose=False, quiet=False)
+    yield tester
+    tester.cleanup()
+
+
+@pytest.fixture(scope="session")
+def employee_ids(tester):
+    ids = [emp_id for emp_id in tester.test_bulk_create_employees(TEST_EMPLOYEES) if emp_id]
+    assert len(ids) >= 4, "Not enough employees created for roster testing"
+    return ids
+
+
+@pytest.fixture(scope="session")
+def roster_month():
+    # Read the clock once so year and month can't straddle a month boundary
+    now = datetime.now()
+    return now.year, now.month
+
+
+@pytest.fixture(scope="session")
+def _employees_and_roster(tester, employee_ids, roster_month):
+    # Listing employees and generating the roster both only need the created
+    # ids, so the two requests overlap
+    return tester.gather(
+        tester.test_get_employees,
+        partial(tester.test_generate_roster, *roster_month, employee_ids, "month"),
+    )
+
+
+@pytest.fixture(scope="session")
+def employees(_employees_and_roster):
+    return _employees_and_roster[0]
+
+
+@pytest.fixture(scope="session")
+def roster_data(_employees_and_roster):
+    roster_data = _employees_and_roster[1]
+    assert roster_data, "Roster generation failed"
+    return roster_data
@@ -0,0 +1,79 @@
+"""Array kernels for the roster rule checks in backend_test.py
+
+Rosters are checked as int8 matrices S[emp, day] of SHIFT_CODES; every rule
+is a handful of whole-matrix NumPy expressions, with no per-day Python loop.
+"""
+import numpy as np
+
+# int8 codes for shifts in the schedule matrix; hours keep their own value
+SHIFT_CODES = {'0': 0, '7': 7, '9': 9, '15': 15, '23': 23, 'V': -1, 'L': -2}
+NO_SHIFT = -3       # day absent from the employee's schedule
+UNKNOWN_SHIFT = -4  # any other value
+
+VACATION = SHIFT_CODES['V']
+LEAVE = SHIFT_CODES['L']
+
+# Codes in the transitions matrix returned by check_all
+AM_PM = 1
+PM_AM = 2
+
+
+def check_invariants(mat):
+    """Count employees breaking night-shift contiguity and off-day pairing
+
+    A night violation is any working day between two night shifts; an off
+    violation is an off day with neither neighbour off.
+    Returns (night_violations, off_violations).
+    """
+    nights = mat == 23
+    working = ~np.isin(mat, [0, 23, NO_SHIFT])
+    night_before = np.cumsum(nights, axis=1) > 0
+    night_after = np.cumsum(nights[:, ::-1], axis=1)[:, ::-1] > 0
+    night_violations = (working & night_before & night_after).any(axis=1).sum()
+
+    off = np.pad(mat == 0, ((0, 0), (1, 1)))
+    isolated = off[:, 1:-1] & ~off[:, :-2] & ~off[:, 2:]
+    off_violations = isolated.any(axis=1).sum()
+    return int(night_violations), int(off_violations)
+
+
+def check_all(S, flexible, fixed):
+    """Evaluate the month rules on S in one pass
+
+    flexible and fixed are boolean row masks; night blocks and AM/PM transitions
+    are only reported for flexible rows, shift-type violations for fixed rows.
+    Returns (week_off_counts, week_has_pair, off_per_day, fixed_bad,
+    night_block_len, transitions): off-day counts and an adjacent-pair flag per
+    full week, staff off per day, non-9am cells of fixed rows, the length of
+    each night block at its first day (0 elsewhere), and AM_PM / PM_AM at the
+    first day of each transition.
+    """
+    E, D = S.shape
+    off = S == 0
+
+    # Only full weeks (days 1-7, 8-14, ...) are counted
+    W = D // 7
+    week_off = off[:, :W * 7].reshape(E, W, 7)
+
+    # Night blocks: +1 where a run starts, -1 just past where it ends
+    nights = ((S == 23) & flexible[:, None]).astype(np.int8)
+    edges = np.diff(np.pad(nights, ((0, 0), (1, 1))), axis=1)
+    rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    night_block_len = np.zeros((E, D), dtype=np.int64)
+    night_block_len[rows, starts] = ends - starts
+
+    today, tomorrow = S[:, :-1], S[:, 1:]
+    transitions = np.zeros((E, max(D - 1, 0)), dtype=np.int8)
+    transitions[flexible[:, None] & (today == 7) & (tomorrow == 15)] = AM_PM
+    transitions[flexible[:, None] & (today == 15) & (tomorrow == 7)] = PM_AM
+
+    return (
+        week_off.sum(axis=2),
+        (week_off[:, :, :-1] & week_off[:, :, 1:]).any(axis=2),
+        off.sum(axis=0),
+        fixed[:, None] & ~np.isin(S, [9, 0, VACATION, LEAVE]),
+        night_block_len,
+        transitions,
+    )
+